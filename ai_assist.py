@@ -1,14 +1,51 @@
 # -*- coding: utf-8 -*-
-import json
 import re
+import json
 import time
+import random
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, List, Tuple, Any, Optional
+from typing import Dict, List, Tuple, Any, Optional, Sequence
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+# a JSON number token of 20+ digits: orjson turns integers wider than 64 bits into floats
+_WIDE_INT_RE = re.compile(r"[:\[,]\s*-?\d{20}")
+
+def _loads(s: str):
+    # orjson is not a drop-in json.loads: it rejects NaN/Infinity and loses wide integers,
+    # so those replies go to json.loads instead of coming back as "no JSON"
+    if orjson is None or _WIDE_INT_RE.search(s):
+        return json.loads(s)
+    try:
+        return orjson.loads(s)
+    except ValueError:
+        return json.loads(s)
 
 PERPLEXITY_CHAT_URL = "https://api.perplexity.ai/chat/completions"  # official :contentReference[oaicite:3]{index=3}
 
+# one keep-alive session for all calls (no TCP/TLS handshake per request);
+# retries stay in ai_fill_missing_fields
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=Retry(total=0, backoff_factor=0)))
+
+FORMAT_RULES = """
+- التواريخ بصيغة DD/MM/YYYY فقط.
+- الحقول المالية/العددية: أرقام فقط بدون فواصل/رموز/عملة.
+- رقم الجوال: بدون مسافات، وإذا بدأ بـ 9660 احذف الصفر بعد 966 (9665....).
+- أجر الساعة الإضافية: رقم فقط (مثال 50).
+- مدة العقد: رقم فقط (1 للسنة، 6 لستة أشهر...).
+""".strip()
+
+SYSTEM_PROMPT = "أنت مساعد دقيق للغاية لاستخراج الحقول بشكل منظم بصيغة JSON فقط."
+
 @dataclass
 class AIResult:
     values: Dict[str, str]
@@ -17,6 +54,33 @@ class AIResult:
     raw_text: str
     error: str = ""
 
+def _find_first_json_object(text: str) -> Optional[str]:
+    """
+    Linear scan for the first balanced {...} block (braces inside strings ignored).
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+    depth, in_str, esc = 0, False, False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_str:
+            if esc:
+                esc = False
+            elif c == "\\":
+                esc = True
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
 def _extract_json_block(text: str) -> Optional[dict]:
     """
     Robust JSON extraction: accepts pure JSON or JSON wrapped in text.
@@ -24,37 +88,65 @@ def _extract_json_block(text: str) -> Optional[dict]:
     if not text:
         return None
 
-    text = text.strip()
-
-    # direct JSON
-    if text.startswith("{") and text.endswith("}"):
-        try:
-            return json.loads(text)
-        except Exception:
-            pass
+    # direct JSON (the usual case): parsers skip surrounding whitespace, no strip/startswith needed
+    try:
+        obj = _loads(text)
+        if isinstance(obj, dict):
+            return obj
+    except Exception:
+        pass
 
     # try to find the first {...} block
-    m = re.search(r"\{.*\}", text, flags=re.DOTALL)
-    if not m:
+    candidate = _find_first_json_object(text)
+    if candidate is None:
         return None
-    candidate = m.group(0)
     try:
-        return json.loads(candidate)
+        return _loads(candidate)
     except Exception:
         return None
 
 def _safe_float(x, default=0.0) -> float:
+    # fast paths: numbers pass through, empty/None never reach the (slow) exception path
+    if isinstance(x, (int, float)):
+        return float(x)
+    if not x:
+        return default
     try:
         return float(x)
     except Exception:
         return default
 
+def _to_ai_result(values_obj, evidence, conf, schema_fields: List[str], content: str) -> AIResult:
+    values_obj = values_obj if isinstance(values_obj, dict) else {}
+
+    values: Dict[str, str] = {}
+    for f in schema_fields:
+        v = values_obj.get(f, "")
+        values[f] = "" if v is None else str(v).strip()
+
+    evidence_map = {k: str(v).strip() for k, v in (evidence.items() if isinstance(evidence, dict) else [])}
+    conf_map = {k: _safe_float(v, 0.0) for k, v in (conf.items() if isinstance(conf, dict) else [])}
+
+    return AIResult(values=values, evidence=evidence_map, confidence=conf_map, raw_text=content)
+
+def _sleep_backoff(attempt: int, resp=None) -> None:
+    """
+    Exponential backoff with jitter (so concurrent calls don't retry in lockstep).
+    Honors Retry-After (seconds) on 429.
+    """
+    if resp is not None and resp.status_code == 429:
+        retry_after = _safe_float(resp.headers.get("Retry-After"), -1.0)
+        if retry_after >= 0:
+            time.sleep(min(retry_after, 30.0))
+            return
+    time.sleep(min(8.0, 0.5 * (2 ** attempt)) + random.uniform(0, 0.25))
+
 def _post_perplexity(api_key: str, payload: dict, timeout_s: int = 60) -> dict:
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json",
     }
-    r = requests.post(PERPLEXITY_CHAT_URL, headers=headers, json=payload, timeout=timeout_s)
+    r = _SESSION.post(PERPLEXITY_CHAT_URL, headers=headers, json=payload, timeout=timeout_s)
     r.raise_for_status()
     return r.json()
 
@@ -63,7 +155,7 @@ def ai_fill_missing_fields(
     model: str,
     normalized_text: str,
     missing_fields: List[str],
-    headers_all: List[str],
+    headers_all: Sequence[str],
     max_chars: int = 22000,
     temperature: float = 0.0,
     retry: int = 2,
@@ -96,11 +188,7 @@ def ai_fill_missing_fields(
 - أعد JSON فقط (بدون شرح).
 - المفاتيح يجب أن تكون EXACT نفس أسماء الحقول أعلاه.
 - أي حقل غير موجود بالنص: اجعله "".
-- التواريخ بصيغة DD/MM/YYYY فقط.
-- الحقول المالية/العددية: أرقام فقط بدون فواصل/رموز/عملة.
-- رقم الجوال: بدون مسافات، وإذا بدأ بـ 9660 احذف الصفر بعد 966 (9665....).
-- أجر الساعة الإضافية: رقم فقط (مثال 50).
-- مدة العقد: رقم فقط (1 للسنة، 6 لستة أشهر...).
+{FORMAT_RULES}
 - أضف كائنات إضافية داخل JSON:
   - "_evidence": قاموس (field -> مقتطف قصير من النص يثبت القيمة)
   - "_confidence": قاموس (field -> رقم من 0 إلى 1)
@@ -112,7 +200,7 @@ def ai_fill_missing_fields(
     payload = {
         "model": model,
         "messages": [
-            {"role": "system", "content": "أنت مساعد دقيق للغاية لاستخراج الحقول بشكل منظم بصيغة JSON فقط."},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": prompt},
         ],
         "temperature": temperature,
@@ -130,21 +218,150 @@ def ai_fill_missing_fields(
             evidence = obj.pop("_evidence", {}) or {}
             conf = obj.pop("_confidence", {}) or {}
 
-            values: Dict[str, str] = {}
-            for f in schema_fields:
-                v = obj.get(f, "")
-                values[f] = "" if v is None else str(v).strip()
+            return _to_ai_result(obj, evidence, conf, schema_fields, content)
 
-            evidence_map = {k: str(v).strip() for k, v in (evidence.items() if isinstance(evidence, dict) else [])}
-            conf_map = {k: _safe_float(v, 0.0) for k, v in (conf.items() if isinstance(conf, dict) else [])}
+        except Exception as e:
+            last_err = f"{type(e).__name__}: {e}"
+            if attempt < retry:
+                _sleep_backoff(attempt, getattr(e, "response", None))
 
-            return AIResult(values=values, evidence=evidence_map, confidence=conf_map, raw_text=content)
+    return AIResult(values={}, evidence={}, confidence={}, raw_text="", error=last_err)
+
+def _ai_fill_group(api_key: str, model: str, group: List[dict], temperature: float, retry: int) -> List[AIResult]:
+    """
+    One request for a group of contracts. group[n] = {"fields": [...], "text": "..."}.
+    Returns one AIResult per group entry, in order.
+    """
+    batch = [{"i": n, "fields": job["fields"], "text": job["text"]} for n, job in enumerate(group)]
+
+    prompt = f"""
+أنت وكيل استخراج بيانات عقود عمل سعودية (قوى).
+لديك عدة عقود (بعد التطبيع) داخل مصفوفة JSON. لكل عقد رقم "i" وقائمة "fields" بالحقول الناقصة و"text" نص العقد.
+املأ لكل عقد الحقول الناقصة الخاصة به فقط بدقة.
+
+قواعد الإخراج:
+- أعد JSON فقط (بدون شرح) بالشكل:
+  {{"results": [{{"i": 0, "values": {{...}}, "_evidence": {{...}}, "_confidence": {{...}}}}]}}
+- نتيجة واحدة لكل عقد بنفس رقم "i"، ولا تخلط بين العقود.
+- مفاتيح "values" يجب أن تكون EXACT نفس أسماء الحقول في "fields" لذلك العقد.
+- أي حقل غير موجود بالنص: اجعله "".
+{FORMAT_RULES}
+- "_evidence": قاموس (field -> مقتطف قصير من النص يثبت القيمة)
+- "_confidence": قاموس (field -> رقم من 0 إلى 1)
+
+العقود:
+{json.dumps(batch, ensure_ascii=False)}
+""".strip()
+
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": temperature,
+    }
+
+    last_err = ""
+    for attempt in range(retry + 1):
+        try:
+            data = _post_perplexity(api_key, payload)
+            content = data["choices"][0]["message"]["content"]
+            obj = _extract_json_block(content)
+            results = obj.get("results") if isinstance(obj, dict) else None
+            if not isinstance(results, list):
+                return [AIResult(values={}, evidence={}, confidence={}, raw_text=content, error="AI returned non-JSON") for _ in group]
+
+            by_i = {item["i"]: item for item in results if isinstance(item, dict) and isinstance(item.get("i"), int)}
+
+            out = []
+            for n, job in enumerate(group):
+                item = by_i.get(n)
+                if item is None:
+                    out.append(AIResult(values={}, evidence={}, confidence={}, raw_text=content, error="AI returned no result for this contract"))
+                    continue
+                out.append(_to_ai_result(item.get("values"), item.get("_evidence"), item.get("_confidence"), job["fields"], content))
+            return out
 
         except Exception as e:
             last_err = f"{type(e).__name__}: {e}"
-            time.sleep(0.6)
+            if attempt < retry:
+                _sleep_backoff(attempt, getattr(e, "response", None))
 
-    return AIResult(values={}, evidence={}, confidence={}, raw_text="", error=last_err)
+    return [AIResult(values={}, evidence={}, confidence={}, raw_text="", error=last_err) for _ in group]
+
+def ai_fill_missing_fields_batch(
+    api_key: str,
+    model: str,
+    items: List[Tuple[str, List[str]]],
+    headers_all: Sequence[str],
+    max_chars: int = 22000,
+    max_group_chars: int = 60000,
+    group_size: int = 6,
+    temperature: float = 0.0,
+    retry: int = 2,
+) -> List[AIResult]:
+    """
+    Same as ai_fill_missing_fields for many contracts, packing several into one request.
+      items[i] = (normalized_text, missing_fields)
+    Each text is cut to max_chars; a group holds at most group_size contracts
+    and max_group_chars of text. Returns one AIResult per item, in order.
+    """
+    if not api_key:
+        return [AIResult(values={}, evidence={}, confidence={}, raw_text="", error="Missing PERPLEXITY_API_KEY") for _ in items]
+
+    groups: List[List[dict]] = []
+    group: List[dict] = []
+    group_chars = 0
+    for i, (normalized_text, missing_fields) in enumerate(items):
+        text = (normalized_text or "").strip()[:max_chars]
+        if group and (len(group) >= group_size or group_chars + len(text) > max_group_chars):
+            groups.append(group)
+            group, group_chars = [], 0
+        group.append({"index": i, "fields": [f for f in missing_fields if f in headers_all], "text": text})
+        group_chars += len(text)
+    if group:
+        groups.append(group)
+
+    results: List[AIResult] = [None] * len(items)
+    for group in groups:
+        for job, res in zip(group, _ai_fill_group(api_key, model, group, temperature, retry)):
+            results[job["index"]] = res
+    return results
+
+def ai_fill_many(
+    api_key: str,
+    model: str,
+    items: List[Tuple[str, List[str]]],
+    headers_all: Sequence[str],
+    max_chars: int = 22000,
+    temperature: float = 0.0,
+    retry: int = 2,
+    max_workers: int = 8,
+) -> List[AIResult]:
+    """
+    One request per contract (no batching), but up to max_workers in flight at once
+    so the LLM latencies overlap. items[i] = (normalized_text, missing_fields).
+    Returns one AIResult per item, in order.
+    """
+    if not items:
+        return []
+
+    def _one(item):
+        normalized_text, missing_fields = item
+        return ai_fill_missing_fields(
+            api_key=api_key,
+            model=model,
+            normalized_text=normalized_text,
+            missing_fields=missing_fields,
+            headers_all=headers_all,
+            max_chars=max_chars,
+            temperature=temperature,
+            retry=retry,
+        )
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as ex:
+        return list(ex.map(_one, items))
 
 def merge_row_with_ai(row: Dict[str, str], ai: AIResult, only_fill_empty: bool = True) -> Tuple[Dict[str, str], int]:
     """
@@ -1,29 +1,42 @@
 # -*- coding: utf-8 -*-
 import io
 import os
+import hashlib
 import time
 import shutil
 import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 
 import streamlit as st
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment
-from openpyxl.utils import get_column_letter
 
 from pdf_contracts import (
     HEADERS,
-    parse_contract,
-    extract_raw_and_normalized_text,
     calc_quality,
+    extract_and_parse,
 )
 
-from ai_assist import ai_fill_missing_fields, merge_row_with_ai
+from ai_assist import ai_fill_missing_fields_batch, ai_fill_many, merge_row_with_ai
 
 APP_TITLE = "📄 تحويل عقود PDF إلى Excel (قوي + وكيل Perplexity + تقرير)"
 OUTPUT_FILE_NAME = "Employees_Data.xlsx"
 SHEET_MAIN = "الموظفين"
 SHEET_LOGS = "Logs"
+PARSE_CACHE_MAX = 512
+
+LOG_HEADERS = [
+    "timestamp", "file_name", "status",
+    "filled_fields", "total_fields", "quality_%", "ai_filled",
+    "missing_fields", "note"
+]
+LOG_KEYS = [
+    "timestamp", "file_name", "status",
+    "filled_fields", "total_fields", "quality_pct", "ai_filled",
+    "missing_fields", "note"
+]
 
 st.set_page_config(page_title="PDF → Excel (عقود الموظفين)", page_icon="📄", layout="wide")
 st.title(APP_TITLE)
@@ -34,101 +47,100 @@ st.write(
 )
 
 with st.expander("⚙️ إعدادات", expanded=False):
-    c1, c2, c3, c4 = st.columns(4)
+    c1, c2, c3 = st.columns(3)
     with c1:
         include_logs_sheet = st.checkbox("إضافة ورقة Logs في Excel", value=True)
     with c2:
         enable_debug = st.checkbox("Debug: عرض النص الخام + بعد التطبيع", value=True)
     with c3:
         show_quality_table = st.checkbox("عرض جدول جودة الاستخراج", value=True)
-    with c4:
-        cleanup_delay = st.slider("ثواني قبل تنظيف الملفات المؤقتة", 0, 8, 2)
 
 with st.expander("🤖 إعدادات الوكيل (Perplexity)", expanded=True):
     use_ai = st.checkbox("تشغيل الوكيل (يعبّي الحقول الناقصة بالذكاء)", value=True)
     model = st.selectbox("Model", ["sonar-pro", "sonar"], index=0)
     only_fill_empty = st.checkbox("الذكاء يعبّي الفاضي فقط (لا يغيّر قيم موجودة)", value=True)
+    batch_ai = st.checkbox("دمج عدة عقود في طلب واحد للوكيل (أسرع)", value=False)
     min_quality_before_ai = st.slider("لو الجودة أقل من هذا الرقم، شغّل الذكاء", 0, 100, 85)
     max_chars_to_ai = st.slider("حد أقصى لنص العقد المرسل للذكاء (حماية)", 5000, 40000, 22000, step=1000)
 
 uploaded = st.file_uploader("ارفع ملفات PDF هنا", type=["pdf"], accept_multiple_files=True)
 
-def _auto_width(ws, max_width=70, min_width=10):
-    for col_idx in range(1, ws.max_column + 1):
-        header = ws.cell(row=1, column=col_idx).value or ""
-        max_len = len(str(header))
-        for r in range(2, ws.max_row + 1):
-            v = ws.cell(row=r, column=col_idx).value
-            if v is None:
+def _auto_width(ws, widths, max_width=70, min_width=10):
+    for col_idx, max_len in enumerate(widths):
+        ws.set_column(col_idx, col_idx, min(max(min_width, max_len + 2), max_width))
+
+def _write_sheet(wb, name, headers, values_iter, header_fmt, body_fmt, max_width=70):
+    ws = wb.add_worksheet(name)
+    ws.freeze_panes(1, 0)
+    ws.write_row(0, 0, headers, header_fmt)
+    # track the longest value per column while writing (column info is only emitted on close)
+    widths = [len(h) for h in headers]
+    for r, values in enumerate(values_iter, start=1):
+        ws.write_row(r, 0, values, body_fmt)
+        for i, v in enumerate(values):
+            if not v:
                 continue
-            max_len = max(max_len, len(str(v)))
-        ws.column_dimensions[get_column_letter(col_idx)].width = min(max(min_width, max_len + 2), max_width)
+            n = len(v) if isinstance(v, str) else len(str(v))
+            if n > widths[i]:
+                widths[i] = n
+    _auto_width(ws, widths, max_width=max_width)
+    return ws
 
 def build_excel_bytes(rows, logs=None, include_logs=True):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = SHEET_MAIN
+    import xlsxwriter  # only needed once results exist; keeps it off the first script run
 
-    ws.append(HEADERS)
-    for c in range(1, len(HEADERS) + 1):
-        cell = ws.cell(row=1, column=c)
-        cell.font = Font(bold=True)
-        cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-
-    for row in rows:
-        ws.append([row.get(h, "") if row.get(h, "") is not None else "" for h in HEADERS])
-
-    ws.freeze_panes = "A2"
-    for row_cells in ws.iter_rows(min_row=2, max_row=ws.max_row, max_col=len(HEADERS)):
-        for cell in row_cells:
-            cell.alignment = Alignment(vertical="top", wrap_text=True)
-
-    _auto_width(ws)
+    bio = io.BytesIO()
+    # contract text is data, never formulas/links
+    wb = xlsxwriter.Workbook(bio, {"in_memory": True, "strings_to_formulas": False, "strings_to_urls": False})
+    header_fmt = wb.add_format({"bold": True, "align": "center", "valign": "vcenter", "text_wrap": True})
+    body_fmt = wb.add_format({"valign": "top", "text_wrap": True})
+
+    # rows from process_files always carry every header key
+    _write_sheet(
+        wb, SHEET_MAIN, HEADERS,
+        ([row[h] or "" for h in HEADERS] for row in rows),
+        header_fmt, body_fmt,
+    )
 
     if include_logs:
-        ws2 = wb.create_sheet(SHEET_LOGS)
-        ws2.append([
-            "timestamp", "file_name", "status",
-            "filled_fields", "total_fields", "quality_%", "ai_filled",
-            "missing_fields", "note"
-        ])
-        for c in range(1, 10):
-            cell = ws2.cell(row=1, column=c)
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-
-        if logs:
-            for item in logs:
-                ws2.append([
-                    item.get("timestamp",""),
-                    item.get("file_name",""),
-                    item.get("status",""),
-                    item.get("filled_fields",""),
-                    item.get("total_fields",""),
-                    item.get("quality_pct",""),
-                    item.get("ai_filled",""),
-                    item.get("missing_fields",""),
-                    item.get("note",""),
-                ])
-
-        ws2.freeze_panes = "A2"
-        for row_cells in ws2.iter_rows(min_row=2, max_row=ws2.max_row, max_col=9):
-            for cell in row_cells:
-                cell.alignment = Alignment(vertical="top", wrap_text=True)
-
-        _auto_width(ws2, max_width=90)
+        _write_sheet(
+            wb, SHEET_LOGS, LOG_HEADERS,
+            ([item.get(k, "") for k in LOG_KEYS] for item in (logs or [])),
+            header_fmt, body_fmt, max_width=90,
+        )
 
-    bio = io.BytesIO()
-    wb.save(bio)
-    bio.seek(0)
+    wb.close()
     return bio.getvalue()
 
+@st.cache_data(show_spinner=False, max_entries=4)
+def _build_excel_bytes_cached(data_key, include_logs, _rows, _logs):
+    # data_key = digest of (rows, logs); the underscored args are not hashed by Streamlit
+    return build_excel_bytes(_rows, logs=_logs, include_logs=include_logs)
+
+def _uploads_key(files):
+    # file_id is new for every upload, so a different file with the same name/size doesn't reuse stale results
+    return tuple((f.file_id, f.name, f.size) for f in files)
+
 def safe_lines(s: str, n=120) -> str:
     if not s:
         return ""
     return "\n".join(s.splitlines()[:n])
 
-def process_files(files):
+@st.cache_resource
+def _parse_cache():
+    # process-wide LRU (survives reruns and sessions): content hash -> (raw, norm, data)
+    return OrderedDict(), threading.Lock()
+
+def _spool_upload(f, temp_dir):
+    # copy the upload to disk in chunks (hashing on the way); workers get the path instead of pickled bytes
+    digest = hashlib.blake2b(digest_size=16)
+    with tempfile.NamedTemporaryFile(delete=False, dir=temp_dir, suffix=".pdf") as tmp:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+            tmp.write(chunk)
+        return tmp.name, tmp.tell(), digest.digest()
+
+def process_files(files, temp_dir=None):
     rows = []
     logs = []
     debug_items = []
@@ -140,22 +152,128 @@ def process_files(files):
     progress = st.progress(0)
     status = st.empty()
 
-    for i, f in enumerate(files, start=1):
-        status.write(f"جارٍ معالجة الملف {i}/{total_files}: **{f.name}**")
+    # every progress() call is a websocket frame + re-render: repaint at most every 200 ms
+    last_tick = [0, 0.0]  # pct, monotonic ts
+
+    def _tick(pct, force=False):
+        now = time.monotonic()
+        if force or (pct != last_tick[0] and now - last_tick[1] > 0.2):
+            progress.progress(pct)
+            last_tick[0], last_tick[1] = pct, now
+
+    names = [f.name for f in files]
+
+    # 0) PDF extraction + rule-based parse: CPU-bound and independent per file -> process pool
+    status.write(f"جارٍ استخراج النص من {total_files} ملف...")
+    parsed = [None] * total_files
+    spooled = []
+    jobs = {}     # content hash -> first file index; identical PDFs are parsed once
+    results = {}  # content hash -> (raw, norm, data) or the worker's exception
+    futures = {}
+    fresh = []    # hashes parsed in this run (cache candidates)
+    cache, cache_lock = _parse_cache()
+
+    # a single upload is parsed in-process from its bytes: no temp file, no worker start-up
+    inline = temp_dir is None or total_files == 1
+    pool = nullcontext() if inline else ProcessPoolExecutor(max_workers=min(total_files, os.cpu_count() or 1, 4))
+
+    # each upload is submitted as soon as it is on disk, so spooling the next one overlaps parsing
+    with pool as ex:
+        for i, f in enumerate(files):
+            try:
+                if inline:
+                    pdf_bytes = f.getvalue()
+                    path, size, digest = None, len(pdf_bytes), hashlib.blake2b(pdf_bytes, digest_size=16).digest()
+                else:
+                    path, size, digest = _spool_upload(f, temp_dir)
+            except Exception as e:
+                # unreadable upload / full temp dir: this file gets an ERROR row, the batch goes on
+                parsed[i] = e
+                spooled.append((None, None, None))
+                continue
+            spooled.append((path, size, digest))
+            if size < 50 or digest in jobs:
+                continue
+            jobs[digest] = i
+            # results from earlier runs (re-clicks, other sessions) are reused as-is
+            with cache_lock:
+                if digest in cache:
+                    cache.move_to_end(digest)
+                    results[digest] = cache[digest]
+                    continue
+            fresh.append(digest)
+            if inline:
+                try:
+                    results[digest] = extract_and_parse(pdf_bytes)
+                except Exception as e:
+                    results[digest] = e
+            else:
+                futures[ex.submit(extract_and_parse, path)] = digest
+
+        if not inline:
+            for done, fut in enumerate(as_completed(futures), start=1):
+                try:
+                    results[futures[fut]] = fut.result()
+                except Exception as e:
+                    results[futures[fut]] = e
+                _tick(int(done / len(futures) * 50))
+
+    if fresh:
+        with cache_lock:
+            for digest in fresh:
+                if not isinstance(results[digest], Exception):
+                    cache[digest] = results[digest]
+            while len(cache) > PARSE_CACHE_MAX:
+                cache.popitem(last=False)
+
+    for i, (_, size, digest) in enumerate(spooled):
+        if size is not None and size >= 50:
+            parsed[i] = results[digest]
+
+    # 1) rule-based rows; files below the quality threshold go to the AI
+    #    (several contracts per request, or concurrent single requests)
+    base_rows = [None] * total_files
+    need_ai = []
+    for i, result in enumerate(parsed):
+        if result is None or isinstance(result, Exception):
+            continue
+        data = result[2]
+        row = {h: data.get(h) or "" for h in HEADERS}
+        base_rows[i] = row
+        _, _, pct, missing = calc_quality(row)
+        if use_ai and missing and pct < float(min_quality_before_ai):
+            need_ai.append((i, missing))
+
+    ai_results = {}
+    if need_ai:
+        status.write(f"🤖 الوكيل يعبّي الحقول الناقصة لـ {len(need_ai)} ملف...")
+        ai_fill = ai_fill_missing_fields_batch if batch_ai else ai_fill_many
+        batch = ai_fill(
+            api_key=api_key,
+            model=model,
+            items=[(parsed[i][1], missing) for i, missing in need_ai],
+            headers_all=HEADERS,
+            max_chars=int(max_chars_to_ai),
+            temperature=0.0,
+            retry=2,
+        )
+        ai_results = {i: ai for (i, _), ai in zip(need_ai, batch)}
+
+    for i, (name, (_, size, _)) in enumerate(zip(names, spooled), start=1):
+        status.write(f"جارٍ معالجة الملف {i}/{total_files}: **{name}**")
         ts = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
 
         ai_filled = 0
 
         try:
-            pdf_bytes = f.read()
-            if not pdf_bytes or len(pdf_bytes) < 50:
-                row = {h: "" for h in HEADERS}
+            if size is not None and size < 50:
+                row = dict.fromkeys(HEADERS, "")
                 filled, total, pct, missing = calc_quality(row)
 
                 rows.append(row)
                 logs.append({
                     "timestamp": ts,
-                    "file_name": f.name,
+                    "file_name": name,
                     "status": "SKIPPED",
                     "filled_fields": filled,
                     "total_fields": total,
@@ -164,29 +282,22 @@ def process_files(files):
                     "missing_fields": ", ".join(missing[:10]) + (" ..." if len(missing) > 10 else ""),
                     "note": "File empty/too small"
                 })
-                report_lines.append(f"- {f.name}: SKIPPED (empty)")
-                debug_items.append({"file": f.name, "raw": "", "norm": "", "note": "empty"})
+                report_lines.append(f"- {name}: SKIPPED (empty)")
+                debug_items.append({"file": name, "raw": "", "norm": "", "note": "empty"})
             else:
-                raw_text, norm_text = extract_raw_and_normalized_text(pdf_bytes)
+                result = parsed[i - 1]
+                if isinstance(result, Exception):
+                    raise result
+                raw_text, norm_text, _ = result
 
-                # 1) rule-based
-                data = parse_contract(norm_text) or {}
-                row = {h: (data.get(h, "") if data.get(h, "") is not None else "") for h in HEADERS}
+                # 1) rule-based (already parsed in the pool)
+                row = base_rows[i - 1]
                 filled, total, pct, missing = calc_quality(row)
 
-                # 2) AI assist if needed
+                # 2) AI assist if needed (already fetched above)
                 ai_note = ""
-                if use_ai and missing and pct < float(min_quality_before_ai):
-                    ai = ai_fill_missing_fields(
-                        api_key=api_key,
-                        model=model,
-                        normalized_text=norm_text,
-                        missing_fields=missing,
-                        headers_all=HEADERS,
-                        max_chars=int(max_chars_to_ai),
-                        temperature=0.0,
-                        retry=2,
-                    )
+                ai = ai_results.get(i - 1)
+                if ai is not None:
                     if ai.error:
                         ai_note = f"AI_ERROR: {ai.error}"
                     else:
@@ -198,7 +309,7 @@ def process_files(files):
                         if enable_debug:
                             ev_preview = "\n".join([f"{k}: {v}" for k, v in list(ai.evidence.items())[:20]])
                             debug_items.append({
-                                "file": f.name,
+                                "file": name,
                                 "raw": safe_lines(raw_text, 60),
                                 "norm": safe_lines(norm_text, 120),
                                 "note": f"After AI: {pct}% | {ai_note}\nEvidence:\n{ev_preview}"
@@ -212,7 +323,7 @@ def process_files(files):
                 rows.append(row)
                 logs.append({
                     "timestamp": ts,
-                    "file_name": f.name,
+                    "file_name": name,
                     "status": status_label,
                     "filled_fields": filled,
                     "total_fields": total,
@@ -222,23 +333,23 @@ def process_files(files):
                     "note": note
                 })
 
-                report_lines.append(f"- {f.name}: {status_label} | Quality {pct}% | AI filled {ai_filled} | Missing {len(missing)}")
+                report_lines.append(f"- {name}: {status_label} | Quality {pct}% | AI filled {ai_filled} | Missing {len(missing)}")
 
                 if enable_debug and not ai_note:
                     debug_items.append({
-                        "file": f.name,
+                        "file": name,
                         "raw": safe_lines(raw_text, 60),
                         "norm": safe_lines(norm_text, 120),
                         "note": f"Quality {pct}%"
                     })
 
         except Exception as e:
-            row = {h: "" for h in HEADERS}
+            row = dict.fromkeys(HEADERS, "")
             filled, total, pct, missing = calc_quality(row)
             rows.append(row)
             logs.append({
                 "timestamp": ts,
-                "file_name": f.name,
+                "file_name": name,
                 "status": "ERROR",
                 "filled_fields": filled,
                 "total_fields": total,
@@ -247,10 +358,10 @@ def process_files(files):
                 "missing_fields": ", ".join(missing[:10]) + (" ..." if len(missing) > 10 else ""),
                 "note": f"{type(e).__name__}: {str(e)}"
             })
-            report_lines.append(f"- {f.name}: ERROR -> {type(e).__name__}: {str(e)}")
-            debug_items.append({"file": f.name, "raw": "", "norm": "", "note": f"ERROR: {e}"})
+            report_lines.append(f"- {name}: ERROR -> {type(e).__name__}: {str(e)}")
+            debug_items.append({"file": name, "raw": "", "norm": "", "note": f"ERROR: {e}"})
 
-        progress.progress(int(i / total_files * 100))
+        _tick(50 + int(i / total_files * 50), force=(i == total_files))
 
     status.write("✅ انتهت المعالجة.")
     report_text = "PDF Contracts Extraction Report\n" + "\n".join(report_lines)
@@ -263,47 +374,51 @@ else:
     run = False
 
 if run:
-    temp_dir = tempfile.mkdtemp(prefix="pdf_to_excel_")
+    # the scratch dir only holds spooled uploads for the worker pool; one file is parsed in-process
+    temp_dir = tempfile.mkdtemp(prefix="pdf_to_excel_") if len(uploaded) > 1 else None
     try:
-        rows, logs, debug_items, report_text = process_files(uploaded)
-
-        if show_quality_table:
-            st.subheader("📊 جودة الاستخراج لكل ملف")
-            for item in logs:
-                st.write(
-                    f"- **{item['file_name']}** | Status: `{item['status']}` | "
-                    f"Filled: {item['filled_fields']}/{item['total_fields']} | "
-                    f"Quality: **{item['quality_pct']}%** | AI filled: **{item['ai_filled']}** | Missing: {item['missing_fields']}"
-                )
-
-        excel_bytes = build_excel_bytes(rows, logs=logs, include_logs=include_logs_sheet)
-
-        st.success("✅ تم تجهيز ملف Excel بنجاح!")
-        st.download_button(
-            label="⬇️ تنزيل Employees_Data.xlsx",
-            data=excel_bytes,
-            file_name=OUTPUT_FILE_NAME,
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-
-        st.download_button(
-            label="⬇️ تنزيل تقرير مفصل (TXT)",
-            data=report_text.encode("utf-8"),
-            file_name="Extraction_Report.txt",
-            mime="text/plain",
-        )
-
-        if enable_debug:
-            st.subheader("🧪 Debug لكل ملف (خام + بعد التطبيع + أدلة AI)")
-            for d in debug_items:
-                with st.expander(f"📄 {d['file']} — {d['note'][:120]}", expanded=False):
-                    st.text_area("RAW (first 60 lines)", d.get("raw",""), height=200)
-                    st.text_area("NORMALIZED (first 120 lines)", d.get("norm",""), height=280)
-                    if "Evidence:" in d.get("note",""):
-                        st.text_area("AI Evidence Preview", d.get("note",""), height=220)
-
-        st.info("🧹 سيتم حذف الملفات المؤقتة تلقائيًا.")
-        time.sleep(int(cleanup_delay))
-
+        # keep results across reruns (download clicks, settings toggles) for the same uploads
+        st.session_state["results"] = (_uploads_key(uploaded), process_files(uploaded, temp_dir))
     finally:
-        shutil.rmtree(temp_dir, ignore_errors=True)
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+saved = st.session_state.get("results")
+if uploaded and saved and saved[0] == _uploads_key(uploaded):
+    rows, logs, debug_items, report_text = saved[1]
+
+    if show_quality_table:
+        st.subheader("📊 جودة الاستخراج لكل ملف")
+        for item in logs:
+            st.write(
+                f"- **{item['file_name']}** | Status: `{item['status']}` | "
+                f"Filled: {item['filled_fields']}/{item['total_fields']} | "
+                f"Quality: **{item['quality_pct']}%** | AI filled: **{item['ai_filled']}** | Missing: {item['missing_fields']}"
+            )
+
+    data_key = hashlib.blake2b(repr((rows, logs)).encode("utf-8"), digest_size=16).digest()
+    excel_bytes = _build_excel_bytes_cached(data_key, include_logs_sheet, rows, logs)
+
+    st.success("✅ تم تجهيز ملف Excel بنجاح!")
+    st.download_button(
+        label="⬇️ تنزيل Employees_Data.xlsx",
+        data=excel_bytes,
+        file_name=OUTPUT_FILE_NAME,
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+
+    st.download_button(
+        label="⬇️ تنزيل تقرير مفصل (TXT)",
+        data=report_text.encode("utf-8"),
+        file_name="Extraction_Report.txt",
+        mime="text/plain",
+    )
+
+    if enable_debug:
+        st.subheader("🧪 Debug لكل ملف (خام + بعد التطبيع + أدلة AI)")
+        for d in debug_items:
+            with st.expander(f"📄 {d['file']} — {d['note'][:120]}", expanded=False):
+                st.text_area("RAW (first 60 lines)", d.get("raw",""), height=200)
+                st.text_area("NORMALIZED (first 120 lines)", d.get("norm",""), height=280)
+                if "Evidence:" in d.get("note",""):
+                    st.text_area("AI Evidence Preview", d.get("note",""), height=220)
@@ -1,46 +1,91 @@
 # -*- coding: utf-8 -*-
 import re
 import io
+import os
+import functools
+import tempfile
 import unicodedata
-import pdfplumber
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 # =======================
 #  Columns / Headers
 # =======================
-HEADERS = [
+HEADERS = (
     "رقم العقد","تاريخ العقد","شركة/مؤسسة","الرقم الوطني الموحد","رقم المنشأة","السجل التجاري","عنوان الشركة","مكان العمل",
     "بريد الشركة","المسؤول الموقع","الصفة","اسم الموظف","رقم الهوية","نوع الهوية","تاريخ الميلاد","تاريخ انتهاء الهوية",
     "الجنسية","الجنس","الديانة","الحالة الاجتماعية","المؤهل العلمي","التخصص","المهنة","الرقم الوظيفي","رقم الآيبان",
     "اسم البنك","بريد الموظف","رقم الجوال","بدء العقد","انتهاء العقد","تاريخ المباشرة الفعلية","مدة العقد","فترة التجربة",
     "أيام العمل الأسبوعية","ساعات العمل اليومية","الراتب الأساسي","بدل السكن","الإجازة السنوية","أجر الساعة الإضافية",
-    "التعويض عند الفسخ بدون سبب"
-]
+    "التعويض عند الفسخ بدون سبب",
+)
+
+# parse_contract starts from a copy of this (dict.copy() reuses the key table, no rehashing)
+_EMPTY_ROW = dict.fromkeys(HEADERS, "")
 
 EMAIL_RE = re.compile(r"[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}")
-AR_RE = re.compile(r"[\u0600-\u06FF]")
-LAT_RE = re.compile(r"[A-Za-z@]")
+
+# normalization / fixer helpers (compiled once, used per line / per value)
+DIGITS_RE = re.compile(r"\d+")
+DIGIT_RE = re.compile(r"\d")
+AMOUNT_RE = re.compile(r"(\d[\d,]*)(?:\.\d+)?")
+SHORT_REVERSED_RE = re.compile(r"0\d")
+DATE_ANY_RE = re.compile(r"(\d{1,4})[-/](\d{1,2})[-/](\d{1,4})")
+WHITESPACE_RE = re.compile(r"\s+")
+
+# char-class counting on the UTF-8 bytes: bytes.translate(None, delete) is a plain C loop.
+# U+0600..U+06FF are exactly the 2-byte sequences led by 0xD8..0xDB; [A-Za-z@] are single
+# ASCII bytes and never appear inside a multi-byte sequence.
+_ALL_BYTES = bytes(range(256))
+_NON_AR_LEAD_BYTES = bytes(b for b in _ALL_BYTES if not 0xD8 <= b <= 0xDB)
+_NON_LAT_BYTES = bytes(b for b in _ALL_BYTES if not (0x41 <= b <= 0x5A or 0x61 <= b <= 0x7A or b == 0x40))
 
 # =======================
 #  Basic Utils
 # =======================
 def normalize_text(t: str) -> str:
-    t = unicodedata.normalize("NFKC", t or "")
-    t = t.replace("\u200f", "").replace("\u200e", "")
-    return t
+    if not t:
+        return ""
+    if t.isascii():
+        # NFKC never changes ASCII, and the bidi marks below are not ASCII
+        return t
+    t = unicodedata.normalize("NFKC", t)
+    # str.replace scans with memchr; str.translate does a dict lookup per char on non-ASCII text
+    return t.replace("\u200f", "").replace("\u200e", "")
 
 def digits_only(s: str) -> str:
     if not s:
         return ""
-    return "".join(re.findall(r"\d+", str(s)))
+    s = str(s)
+    if s.isdecimal():
+        # isdecimal() is exactly Unicode Nd, i.e. what \d matches: nothing to drop
+        return s
+    return "".join(DIGITS_RE.findall(s))
 
 def ar_count(s: str) -> int:
-    return len(AR_RE.findall(s or ""))
+    if not s:
+        return 0
+    return len(s.encode("utf-8", "surrogatepass").translate(None, _NON_AR_LEAD_BYTES))
 
 def lat_count(s: str) -> int:
-    return len(LAT_RE.findall(s or ""))
+    if not s:
+        return 0
+    return len(s.encode("utf-8", "surrogatepass").translate(None, _NON_LAT_BYTES))
 
 def dig_count(s: str) -> int:
-    return len(re.findall(r"\d", s or ""))
+    return len(DIGIT_RE.findall(s or ""))
+
+def ar_lat_counts(s: str) -> tuple[int, int]:
+    """(ar_count(s), lat_count(s)) from a single encode."""
+    if not s:
+        return 0, 0
+    b = s.encode("utf-8", "surrogatepass")
+    return len(b.translate(None, _NON_AR_LEAD_BYTES)), len(b.translate(None, _NON_LAT_BYTES))
+
+def _is_reversed_label(s: str) -> bool:
+    # Arabic, no latin, and at most 2 digits (digits only counted when the rest already fits)
+    ar, la = ar_lat_counts(s)
+    return ar > 0 and la == 0 and dig_count(s) < 3
 
 def fix_rtl_value(v: str) -> str:
     """
@@ -48,12 +93,19 @@ def fix_rtl_value(v: str) -> str:
     """
     if not v:
         return ""
-    v = str(v).strip()
-    if "@" in v or re.search(r"[A-Za-z]", v):
+    return _fix_rtl_str(str(v))
+
+@functools.lru_cache(maxsize=4096)
+def _fix_rtl_str(v: str) -> str:
+    # unlike a per-contract cache (see parse_contract), this one hits inside a single worker:
+    # nationality/gender/religion/ID-type/bank/company values are a small vocabulary that
+    # repeats in every contract it parses; 4096 short strings stay well under a MB
+    v = v.strip()
+    # any [A-Za-z@] means latin/email: keep as is (so the latin count is 0 below)
+    ar, la = ar_lat_counts(v)
+    if la:
         return v
-    ar = ar_count(v)
-    la = lat_count(v)
-    if ar >= 3 and ar > la:
+    if ar >= 3:
         return v[::-1]
     return v
 
@@ -66,7 +118,7 @@ def clean_amount_to_int(s: str) -> str:
     """
     if not s:
         return ""
-    m = re.search(r"(\d[\d,]*)(?:\.\d+)?", str(s))
+    m = AMOUNT_RE.search(str(s))
     if not m:
         return ""
     return m.group(1).replace(",", "")
@@ -76,7 +128,7 @@ def normalize_reversed_short_number(token: str) -> str:
     Fix short reversed numbers like 09 -> 90, 03 -> 30, 05 -> 50
     """
     token = (token or "").strip()
-    if re.fullmatch(r"0\d", token):
+    if SHORT_REVERSED_RE.fullmatch(token):
         return token[::-1]
     return token
 
@@ -106,13 +158,15 @@ def format_date_any(s: str) -> str:
     """
     if not s:
         return ""
-    s = str(s).strip()
+    if s.__class__ is not str:
+        s = str(s)
 
-    m = re.search(r"(\d{1,4})[-/](\d{1,2})[-/](\d{1,4})", s)
+    # search() skips surrounding whitespace on its own, no strip() copy needed
+    m = DATE_ANY_RE.search(s)
     if not m:
         return ""
 
-    a, b, c = m.group(1), m.group(2), m.group(3)
+    a, b, c = m.groups()
 
     # If year seems reversed (e.g. 3202 / 5202 / 6202)
     if len(c) == 4:
@@ -156,13 +210,13 @@ def smart_normalize_line(line: str) -> str:
     right = right.strip()
 
     # right is reversed arabic label
-    if ar_count(right) > 0 and lat_count(right) == 0 and dig_count(right) < 3:
+    if _is_reversed_label(right):
         label = right[::-1].strip()
         value = left.strip()
         return f"{label}: {value}"
 
     # left is reversed arabic label
-    if ar_count(left) > 0 and lat_count(left) == 0 and dig_count(left) < 3:
+    if _is_reversed_label(left):
         label = left[::-1].strip()
         value = right.strip()
         return f"{label}: {value}"
@@ -178,18 +232,17 @@ def maybe_reverse_sentence(line: str) -> str:
         return ""
     if ":" in s:
         return s
-    ar = ar_count(s)
-    la = lat_count(s)
+    ar, la = ar_lat_counts(s)
     if ar >= 10 and ar > la:
         return s[::-1]
     return s
 
 def normalize_contract_text(raw_text: str) -> str:
+    # NFKC once over the whole text (it never creates or merges line breaks), then one
+    # pass per line: label swap and sentence reversal look at disjoint sets of lines
     lines = []
-    for ln in (raw_text or "").splitlines():
-        ln = normalize_text(ln)
-        ln = smart_normalize_line(ln)
-        ln = maybe_reverse_sentence(ln)
+    for ln in normalize_text(raw_text).splitlines():
+        ln = maybe_reverse_sentence(smart_normalize_line(ln))
         if ln:
             lines.append(ln)
     return "\n".join(lines)
@@ -197,36 +250,122 @@ def normalize_contract_text(raw_text: str) -> str:
 # =======================
 #  PDF Extraction
 # =======================
-def extract_raw_and_normalized_text(pdf_bytes: bytes) -> tuple[str, str]:
-    parts = []
-    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-        for page in pdf.pages:
-            parts.append(normalize_text(page.extract_text() or ""))
-    raw = "\n".join(parts)
+# page-level pool only pays off once worker start-up is spread over enough pages
+PAGE_POOL_MIN_PAGES = 4
+
+def _extract_page_text(path: str, index: int) -> str:
+    import pdfplumber
+
+    # pool worker: reopen the file with only this page selected (pdfplumber numbers pages from 1)
+    with pdfplumber.open(path, pages=[index + 1]) as pdf:
+        page = pdf.pages[0]
+        text = page.extract_text() or ""
+        page.close()
+    return text
+
+def _extract_raw_text(src, max_workers: int = None) -> str:
+    """
+    src: file path, PDF bytes or binary file object.
+    max_workers > 1 extracts the pages of long PDFs (>= PAGE_POOL_MIN_PAGES) in a process pool;
+    leave it unset when the caller already runs one file per worker.
+    """
+    # imported here: pdfplumber pulls in pdfminer.six + Pillow, which text-only callers
+    # (parse_contract, parse_contracts_batch workers) never need
+    import pdfplumber
+
+    with pdfplumber.open(io.BytesIO(src) if isinstance(src, (bytes, bytearray)) else src) as pdf:
+        n_pages = len(pdf.pages)
+        parallel = (
+            max_workers is not None and max_workers > 1
+            and n_pages >= PAGE_POOL_MIN_PAGES
+            and not hasattr(src, "read")  # open file objects can't be sent to workers
+        )
+        if not parallel:
+            parts = []
+            for page in pdf.pages:
+                parts.append(page.extract_text() or "")
+                page.close()  # drop the page's parsed layout objects before the next one
+            # one NFKC call for the document ("\n" never composes, so same result as per page)
+            return normalize_text("\n".join(parts))
+
+    # workers get a path, not n pickled copies of the bytes: spool bytes to disk once
+    tmp_path = None
+    try:
+        if isinstance(src, (bytes, bytearray)):
+            # name recorded before writing, so a failed write (disk full) is still cleaned up
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+                tmp_path = tmp.name
+                tmp.write(src)
+            src = tmp_path
+        with ProcessPoolExecutor(max_workers=min(max_workers, n_pages)) as ex:
+            parts = list(ex.map(_extract_page_text, repeat(src, n_pages), range(n_pages)))
+    finally:
+        if tmp_path:
+            os.unlink(tmp_path)
+    return normalize_text("\n".join(parts))
+
+def extract_raw_and_normalized_text(pdf_bytes: bytes, max_workers: int = None) -> tuple[str, str]:
+    raw = _extract_raw_text(bytes(pdf_bytes), max_workers)
     normalized = normalize_contract_text(raw)
     return raw, normalized
 
-def extract_text_from_pdf_bytes(pdf_bytes: bytes) -> str:
+def extract_text_from_pdf_bytes(pdf_bytes: bytes, max_workers: int = None) -> str:
     # keep old interface
-    _, normalized = extract_raw_and_normalized_text(pdf_bytes)
+    _, normalized = extract_raw_and_normalized_text(pdf_bytes, max_workers)
     return normalized
 
 # =======================
 #  Getters
 # =======================
+@functools.lru_cache(maxsize=256)
+def _label_re(label: str) -> "re.Pattern[str]":
+    return re.compile(rf"{re.escape(label)}\s*:\s*([^\n]+)")
+
 def get_value_after_label(text: str, label: str) -> str:
-    m = re.search(rf"{re.escape(label)}\s*:\s*([^\n]+)", text)
+    m = _label_re(label).search(text)
     return m.group(1).strip() if m else ""
 
-def get_bi(text: str, labels) -> str:
+def build_label_index(text: str) -> dict:
+    """
+    One pass over the lines: "label: value" -> {label: (offset, value)} (first occurrence wins).
+    offset is where the label starts in text, so get_bi can tell whether the regex
+    would have matched this line or an earlier mid-line occurrence.
+    """
+    index = {}
+    pos = 0
+    for ln in text.split("\n"):
+        i = ln.find(":")
+        if i != -1:
+            head = ln[:i]
+            label = head.strip()
+            if label not in index:
+                index[label] = (pos + len(head) - len(head.lstrip()), ln[i + 1:].strip())
+        pos += len(ln) + 1
+    return index
+
+def get_bi(text: str, labels, index: dict = None) -> str:
+    # index hit = no regex; only trusted when the label's first occurrence in text is the
+    # indexed one, otherwise the regex (which returns the earliest match) decides
     for lab in labels:
-        v = get_value_after_label(text, lab)
+        hit = index.get(lab) if index is not None else None
+        if hit is not None and hit[1] and text.find(lab) == hit[0]:
+            v = hit[1]
+        else:
+            v = get_value_after_label(text, lab)
         if v:
             return v
     return ""
 
 def find_line_containing(text: str, keyword: str) -> str:
-    for ln in text.splitlines():
+    # jump to the first hit with str.find and cut out its line, instead of splitting the whole text
+    i = text.find(keyword)
+    if i == -1:
+        return ""
+    start = text.rfind("\n", 0, i) + 1
+    end = text.find("\n", i)
+    line = text[start:end] if end != -1 else text[start:]
+    # other line breaks (\r, \u2028, ...) only survive in un-normalized text
+    for ln in line.splitlines():
         if keyword in ln:
             return ln.strip()
     return ""
@@ -240,7 +379,7 @@ def normalize_mobile_from_line(line: str) -> str:
     """
     if not line:
         return ""
-    groups = re.findall(r"\d+", line)
+    groups = DIGITS_RE.findall(line)
     if not groups:
         return ""
 
@@ -277,110 +416,153 @@ def evidence_snip(text: str, pattern: str, max_len=140) -> str:
     except Exception:
         return ""
 
+# =======================
+#  Parser patterns (compiled once at import)
+# =======================
+CONTRACT_NO_RE = re.compile(r"رقم العقد\s*:\s*(\d+)")
+CONTRACT_DATE_DAY_RE = re.compile(r"في يوم.*?\(?\s*([0-9]{2,4}[-/][0-9]{1,2}[-/][0-9]{2,4})\s*\)?")
+CONTRACT_DATE_PAREN_RE = re.compile(r"\(\s*([0-9]{4}[-/][0-9]{2}[-/][0-9]{2})\s*\)")
+CONTRACT_DATE_DONE_RE = re.compile(r"تم.*?بتاريخ\s*([0-9]{2,4}[-/][0-9]{1,2}[-/][0-9]{2,4})")
+DURATION_RE = re.compile(r"مدة هذا العقد\s+(\d++)\s*(سنة|سنوات|شهر|أشهر)")
+START_END_RE = re.compile(
+    r"يبدأ\s*.*?من\s*تاريخ\s*([0-9]{2,4}[-/][0-9]{1,2}[-/][0-9]{2,4}).*?"
+    r"وينتهي\s*.*?في\s*[,،]?\s*([0-9]{2,4}[-/][0-9]{1,2}[-/][0-9]{2,4})"
+)
+START_RE = re.compile(r"يبدأ\s*.*?من\s*تاريخ\s*([0-9]{2,4}[-/][0-9]{1,2}[-/][0-9]{2,4})")
+END_RE = re.compile(r"وينتهي\s*.*?في\s*[,،]?\s*([0-9]{2,4}[-/][0-9]{1,2}[-/][0-9]{2,4})")
+JOIN_DATE_RE = re.compile(r"تاريخ\s+مباشرة.*?(?:هو|:)?\s*([0-9]{2,4}[-/][0-9]{1,2}[-/][0-9]{2,4})")
+TRIAL_RE = re.compile(r"فترة\s+.*?تجربة.*?مدتها\s*(\d++)\s*يوم")
+WORK_DAYS_RE = re.compile(r"تحدد\s+أيام\s+العمل.*?ب\s*(\d++)\s*أيام")
+WORK_HOURS_RE = re.compile(r"تحدد\s+ساعات\s+العمل.*?ب\s*(\d++)\s*يومي")
+OVERTIME_RE = re.compile(r"(?:٪|%)\s*([0-9]{1,3})")
+BASIC_SALARY_RE = re.compile(r"أجر[ًًا]?\s*أساس[يىي]\s*قدره\s*([0-9][0-9\.,]++)")
+HOUSING_RE = re.compile(r"أجر\s*([0-9][0-9\.,]++)\s*ريال\s*سعودي\s*[,،]?\s*بدل\s*سكن")
+ANNUAL_LEAVE_RE = re.compile(r"إجازة\s*سنوية\s*مدتها\s*(\d++)\s*يوم")
+COMPENSATION_RE = re.compile(r"تعويض[ًًا]?.*?قدره\s*([0-9][0-9\.,]++)\s*ريال\s*سعودي")
+
+def _search_from(pattern: "re.Pattern[str]", text: str, *markers: str):
+    """
+    pattern.search(text), started at the first of `markers` (literals every match begins with).
+    For patterns opening with a char class the regex engine has no literal prefix to skip
+    ahead with; str.find does that scan in C, and no marker -> no regex run at all.
+    """
+    pos = -1
+    for mk in markers:
+        i = text.find(mk)
+        if i != -1 and (pos == -1 or i < pos):
+            pos = i
+    if pos == -1:
+        return None
+    return pattern.search(text, pos)
+
 # =======================
 #  Parser (Strong + Fixers)
 # =======================
 def parse_contract(text: str) -> dict:
-    out = {h: "" for h in HEADERS}
+    # not memoised: the app dedupes uploads by content hash and caches parsed results
+    # itself, and a cache here would live in (and rarely hit inside) each pool worker
+    out = _EMPTY_ROW.copy()
     if not text:
         return out
 
     # ---- Contract number ----
-    m = re.search(r"رقم العقد\s*:\s*(\d+)", text)
+    m = CONTRACT_NO_RE.search(text)
     if m:
         out["رقم العقد"] = m.group(1)
 
     # ---- Contract date ----
-    m = re.search(r"في يوم.*?\(?\s*([0-9]{2,4}[-/][0-9]{1,2}[-/][0-9]{2,4})\s*\)?", text)
+    m = CONTRACT_DATE_DAY_RE.search(text)
     if m:
         out["تاريخ العقد"] = format_date_any(m.group(1))
     if not out["تاريخ العقد"]:
-        m = re.search(r"\(\s*([0-9]{4}[-/][0-9]{2}[-/][0-9]{2})\s*\)", text)
+        m = CONTRACT_DATE_PAREN_RE.search(text)
         if m:
             out["تاريخ العقد"] = format_date_any(m.group(1))
     if not out["تاريخ العقد"]:
-        m = re.search(r"تم.*?بتاريخ\s*([0-9]{2,4}[-/][0-9]{1,2}[-/][0-9]{2,4})", text)
+        m = CONTRACT_DATE_DONE_RE.search(text)
         if m:
             out["تاريخ العقد"] = format_date_any(m.group(1))
 
+    index = build_label_index(text)
+
     # ---- Company ----
-    out["شركة/مؤسسة"] = fix_rtl_value(get_bi(text, ["شركة/مؤسسة", "Corporation/Company"]))
-    out["الرقم الوطني الموحد"] = digits_only(get_bi(text, ["الرقم الوطني الموحد", "National Unified Number"]))
-    out["رقم المنشأة"] = get_bi(text, ["رقم المنشأة", "Establishment Number"]).strip()
-    out["السجل التجاري"] = digits_only(get_bi(text, ["السجل التجاري", "Commercial Registration"]))
-    out["عنوان الشركة"] = fix_rtl_value(get_bi(text, ["العنوان", "Address"]))
-    out["مكان العمل"] = fix_rtl_value(get_bi(text, ["مكان العمل", "Work Location"]))
-
-    # emails: company then employee
-    emails = EMAIL_RE.findall(text)
-    if emails:
-        out["بريد الشركة"] = emails[0]
-        if len(emails) >= 2:
-            out["بريد الموظف"] = emails[1]
+    out["شركة/مؤسسة"] = fix_rtl_value(get_bi(text, ["شركة/مؤسسة", "Corporation/Company"], index))
+    out["الرقم الوطني الموحد"] = digits_only(get_bi(text, ["الرقم الوطني الموحد", "National Unified Number"], index))
+    out["رقم المنشأة"] = get_bi(text, ["رقم المنشأة", "Establishment Number"], index).strip()
+    out["السجل التجاري"] = digits_only(get_bi(text, ["السجل التجاري", "Commercial Registration"], index))
+    out["عنوان الشركة"] = fix_rtl_value(get_bi(text, ["العنوان", "Address"], index))
+    out["مكان العمل"] = fix_rtl_value(get_bi(text, ["مكان العمل", "Work Location"], index))
+
+    # emails: company then employee (stop after the second match)
+    emails = EMAIL_RE.finditer(text)
+    m = next(emails, None)
+    if m:
+        out["بريد الشركة"] = m.group(0)
+        m = next(emails, None)
+        if m:
+            out["بريد الموظف"] = m.group(0)
 
     # ---- Signatory / Position ----
-    sign_raw = get_value_after_label(text, "ويمثلها بالتوقيع")
+    sign_raw = get_bi(text, ["ويمثلها بالتوقيع"], index)
     sign_raw = fix_rtl_value(sign_raw).replace("هتفصب", "بصفته").strip()
     if sign_raw:
-        parts = re.split(r"\s*بصفته\s*", sign_raw, maxsplit=1)
-        if len(parts) == 2:
-            out["المسؤول الموقع"] = parts[0].strip()
-            out["الصفة"] = parts[1].strip()
+        # fixed separator: partition + strip == the old r"\s*بصفته\s*" split at the first hit
+        signer, sep, title = sign_raw.partition("بصفته")
+        if sep:
+            out["المسؤول الموقع"] = signer.strip()
+            out["الصفة"] = title.strip()
         else:
             out["المسؤول الموقع"] = sign_raw
 
     # ---- Employee ----
-    out["اسم الموظف"] = fix_rtl_value(get_bi(text, ["االسم", "الاسم", "Name"]).strip())
-    out["المهنة"] = fix_rtl_value(get_bi(text, ["المهنة", "Profession"]))
-    out["الرقم الوظيفي"] = digits_only(get_bi(text, ["الرقم الوظيفي", "Employee Number"]))
-    out["الجنسية"] = fix_rtl_value(get_bi(text, ["الجنسية", "Nationality"]))
-    out["تاريخ الميلاد"] = format_date_any(get_bi(text, ["تاريخ الميالد", "Date of Birth"]))
-    out["رقم الهوية"] = digits_only(get_bi(text, ["رقم الهوية", "Identity Number"]))
-    out["نوع الهوية"] = fix_rtl_value(get_bi(text, ["نوع الهوية", "ID Type"]))
-    out["تاريخ انتهاء الهوية"] = format_date_any(get_bi(text, ["تاريخ اإلنتهاء", "تاريخ الانتهاء", "ID Expiry Date"]))
-    out["الجنس"] = fix_rtl_value(get_bi(text, ["الجنس", "Gender"]))
-    out["الديانة"] = fix_rtl_value(get_bi(text, ["الديانة", "Religion"]))
-    out["الحالة الاجتماعية"] = fix_rtl_value(get_bi(text, ["الحالة االجتماعية", "الحالة الاجتماعية", "Marital Status"]))
-    out["المؤهل العلمي"] = fix_rtl_value(get_bi(text, ["المؤهل العلمي", "Education"]))
-    out["التخصص"] = fix_rtl_value(get_bi(text, ["التخصص", "Speciality"]))
-
-    iban = get_bi(text, ["رقم اآليبان", "رقم الآيبان", "Iban"])
-    out["رقم الآيبان"] = re.sub(r"\s+", "", iban).strip()
-    out["اسم البنك"] = fix_rtl_value(get_bi(text, ["اسم البنك", "Bank Name"]))
+    out["اسم الموظف"] = fix_rtl_value(get_bi(text, ["االسم", "الاسم", "Name"], index).strip())
+    out["المهنة"] = fix_rtl_value(get_bi(text, ["المهنة", "Profession"], index))
+    out["الرقم الوظيفي"] = digits_only(get_bi(text, ["الرقم الوظيفي", "Employee Number"], index))
+    out["الجنسية"] = fix_rtl_value(get_bi(text, ["الجنسية", "Nationality"], index))
+    out["تاريخ الميلاد"] = format_date_any(get_bi(text, ["تاريخ الميالد", "Date of Birth"], index))
+    out["رقم الهوية"] = digits_only(get_bi(text, ["رقم الهوية", "Identity Number"], index))
+    out["نوع الهوية"] = fix_rtl_value(get_bi(text, ["نوع الهوية", "ID Type"], index))
+    out["تاريخ انتهاء الهوية"] = format_date_any(get_bi(text, ["تاريخ اإلنتهاء", "تاريخ الانتهاء", "ID Expiry Date"], index))
+    out["الجنس"] = fix_rtl_value(get_bi(text, ["الجنس", "Gender"], index))
+    out["الديانة"] = fix_rtl_value(get_bi(text, ["الديانة", "Religion"], index))
+    out["الحالة الاجتماعية"] = fix_rtl_value(get_bi(text, ["الحالة االجتماعية", "الحالة الاجتماعية", "Marital Status"], index))
+    out["المؤهل العلمي"] = fix_rtl_value(get_bi(text, ["المؤهل العلمي", "Education"], index))
+    out["التخصص"] = fix_rtl_value(get_bi(text, ["التخصص", "Speciality"], index))
+
+    iban = get_bi(text, ["رقم اآليبان", "رقم الآيبان", "Iban"], index)
+    out["رقم الآيبان"] = WHITESPACE_RE.sub("", iban).strip()
+    out["اسم البنك"] = fix_rtl_value(get_bi(text, ["اسم البنك", "Bank Name"], index))
 
     mobile_line = find_line_containing(text, "رقم الجوال")
     if mobile_line:
         out["رقم الجوال"] = normalize_mobile_from_line(mobile_line)
 
     # ---- Terms ----
-    m = re.search(r"مدة هذا العقد\s+(\d+)\s*(سنة|سنوات|شهر|أشهر)", text)
+    m = DURATION_RE.search(text)
     if m:
         out["مدة العقد"] = digits_only(m.group(1))
 
-    # Start/End
-    m = re.search(
-        r"يبدأ\s*.*?من\s*تاريخ\s*([0-9]{2,4}[-/][0-9]{1,2}[-/][0-9]{2,4}).*?"
-        r"وينتهي\s*.*?في\s*[,،]?\s*([0-9]{2,4}[-/][0-9]{1,2}[-/][0-9]{2,4})",
-        text
-    )
+    # Start/End: START_END_RE's lazy spans backtrack over the rest of each line for every
+    # "يبدأ"; without a "وينتهي" anywhere it cannot match, so don't pay for the attempt
+    m = _search_from(START_END_RE, text, "يبدأ") if "وينتهي" in text else None
     if m:
         out["بدء العقد"] = format_date_any(m.group(1))
         out["انتهاء العقد"] = format_date_any(m.group(2))
     else:
-        m1 = re.search(r"يبدأ\s*.*?من\s*تاريخ\s*([0-9]{2,4}[-/][0-9]{1,2}[-/][0-9]{2,4})", text)
-        m2 = re.search(r"وينتهي\s*.*?في\s*[,،]?\s*([0-9]{2,4}[-/][0-9]{1,2}[-/][0-9]{2,4})", text)
+        m1 = START_RE.search(text)
+        m2 = END_RE.search(text)
         if m1:
             out["بدء العقد"] = format_date_any(m1.group(1))
         if m2:
             out["انتهاء العقد"] = format_date_any(m2.group(1))
 
     # Joining date
-    m = re.search(r"تاريخ\s+مباشرة.*?(?:هو|:)?\s*([0-9]{2,4}[-/][0-9]{1,2}[-/][0-9]{2,4})", text)
+    m = JOIN_DATE_RE.search(text)
     if m:
         out["تاريخ المباشرة الفعلية"] = format_date_any(m.group(1))
 
     # Trial period (09 -> 90)
-    m = re.search(r"فترة\s+.*?تجربة.*?مدتها\s*(\d+)\s*يوم", text)
+    m = TRIAL_RE.search(text)
     if m:
         t = m.group(1)
         if len(t) == 2:
@@ -388,16 +570,16 @@ def parse_contract(text: str) -> dict:
         out["فترة التجربة"] = digits_only(t)
 
     # Work days / hours
-    m = re.search(r"تحدد\s+أيام\s+العمل.*?ب\s*(\d+)\s*أيام", text)
+    m = WORK_DAYS_RE.search(text)
     if m:
         out["أيام العمل الأسبوعية"] = digits_only(m.group(1))
 
-    m = re.search(r"تحدد\s+ساعات\s+العمل.*?ب\s*(\d+)\s*يومي", text)
+    m = WORK_HOURS_RE.search(text)
     if m:
         out["ساعات العمل اليومية"] = digits_only(m.group(1))
 
     # Overtime percent (05 -> 50)
-    m = re.search(r"(?:٪|%)\s*([0-9]{1,3})", text)
+    m = _search_from(OVERTIME_RE, text, "%", "٪")
     if m:
         p = m.group(1)
         if len(p) == 2:
@@ -405,16 +587,16 @@ def parse_contract(text: str) -> dict:
         out["أجر الساعة الإضافية"] = digits_only(p)
 
     # ---- Money ----
-    m = re.search(r"أجر[ًًا]?\s*أساس[يىي]\s*قدره\s*([0-9][0-9\.,]+)", text)
+    m = BASIC_SALARY_RE.search(text)
     if m:
         out["الراتب الأساسي"] = normalize_amount_token(m.group(1))
 
-    m = re.search(r"أجر\s*([0-9][0-9\.,]+)\s*ريال\s*سعودي\s*[,،]?\s*بدل\s*سكن", text)
+    m = HOUSING_RE.search(text)
     if m:
         out["بدل السكن"] = normalize_amount_token(m.group(1))
 
     # Annual leave (03 -> 30)
-    m = re.search(r"إجازة\s*سنوية\s*مدتها\s*(\d+)\s*يوم", text)
+    m = ANNUAL_LEAVE_RE.search(text)
     if m:
         d = m.group(1)
         if len(d) == 2:
@@ -422,14 +604,12 @@ def parse_contract(text: str) -> dict:
         out["الإجازة السنوية"] = digits_only(d)
 
     # Termination compensation
-    m = re.search(r"تعويض[ًًا]?.*?قدره\s*([0-9][0-9\.,]+)\s*ريال\s*سعودي", text)
+    m = COMPENSATION_RE.search(text)
     if m:
         out["التعويض عند الفسخ بدون سبب"] = normalize_amount_token(m.group(1))
 
-    # Final cleanup
-    for k in list(out.keys()):
-        out[k] = "" if out[k] is None else str(out[k]).strip()
-
+    # every assignment above already yields a stripped str (fix_rtl_value / digits_only /
+    # format_date_any / normalize_amount_token / explicit .strip()), so no final sweep
     return out
 
 # =======================
@@ -438,12 +618,41 @@ def parse_contract(text: str) -> dict:
 def calc_quality(row: dict) -> tuple[int, int, float, list[str]]:
     total = len(HEADERS)
     missing = []
-    filled = 0
     for h in HEADERS:
-        v = str(row.get(h, "")).strip()
-        if v:
-            filled += 1
-        else:
+        v = row.get(h, "")
+        if v.__class__ is not str:
+            v = str(v)
+        # isspace() == "strip() leaves nothing", without allocating the stripped copy
+        if not v or v.isspace():
             missing.append(h)
+    filled = total - len(missing)
     pct = round((filled / total) * 100, 1) if total else 0.0
     return filled, total, pct, missing
+
+# =======================
+#  Pipeline (process-pool safe)
+# =======================
+def extract_and_parse(src, max_workers: int = None) -> tuple[str, str, dict]:
+    """
+    Full per-file pipeline: PDF -> raw text -> normalized text -> parsed row.
+    src is PDF bytes or a file path (a path is cheaper to send to a worker than the bytes).
+    Top-level + plain bytes/str/dict in and out so it can run in a ProcessPoolExecutor.
+    """
+    # a path is handed to pdfplumber as-is: it reads the file lazily, never as one blob
+    raw = _extract_raw_text(src, max_workers)
+    normalized = normalize_contract_text(raw)
+    return raw, normalized, parse_contract(normalized) or {}
+
+def parse_contracts_batch(texts, max_workers: int = None) -> list[dict]:
+    """
+    parse_contract over many already-extracted texts, results in input order.
+    max_workers > 1 spreads the texts over a process pool in chunks (each task carries
+    several texts, so pickling/IPC is paid per chunk); only worth it for large batches.
+    """
+    texts = list(texts)
+    if max_workers is None or max_workers <= 1 or len(texts) < 2:
+        return [parse_contract(t) for t in texts]
+    max_workers = min(max_workers, len(texts))
+    chunksize = max(1, len(texts) // (4 * max_workers))
+    with ProcessPoolExecutor(max_workers=max_workers) as ex:
+        return list(ex.map(parse_contract, texts, chunksize=chunksize))